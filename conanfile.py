@@ -5,6 +5,18 @@ import os
 
 
 class CppTemplateConan(ConanFile):
+    """Conan recipe for the cpp_template library
+    
+    Tests and documentation are off by default so consumers only resolve the
+    runtime dependencies. Enable them when building the project itself with
+    ``-o with_tests=True`` and ``-o with_docs=True``.
+    
+    The library is built with the Ninja generator, so ``ninja`` must be on
+    PATH. Build parallelism follows Conan's ``tools.build:jobs`` setting,
+    which defaults to the number of CPUs. Outside Windows, pass
+    ``-o with_ccache=True`` to compile through a Conan-provided ccache.
+    """
+    
     name = "cpp_template"
     version = "1.0.0"
     
@@ -15,12 +27,14 @@ class CppTemplateConan(ConanFile):
         "fPIC": [True, False],
         "with_tests": [True, False],
         "with_docs": [True, False],
+        "with_ccache": [True, False],
     }
     default_options = {
         "shared": False,
         "fPIC": True,
-        "with_tests": True,
-        "with_docs": True,
+        "with_tests": False,
+        "with_docs": False,
+        "with_ccache": False,
     }
     
     # Sources are located in the same place as this recipe, copy them to the recipe
@@ -29,6 +43,7 @@ class CppTemplateConan(ConanFile):
     def config_options(self):
         if self.settings.os == "Windows":
             self.options.rm_safe("fPIC")
+            self.options.rm_safe("with_ccache")
     
     def configure(self):
         if self.options.shared:
@@ -40,16 +55,27 @@ class CppTemplateConan(ConanFile):
         self.requires("spdlog/1.12.0")
         self.requires("nlohmann_json/3.11.3")
         
-        # Optional dependencies based on options
+        # Test dependencies are opt-in; test_requires are never propagated to
+        # consumers of this package
         if self.options.with_tests:
             self.test_requires("gtest/1.14.0")
             self.test_requires("benchmark/1.8.3")
     
     def build_requirements(self):
+        if self.options.get_safe("with_ccache"):
+            self.tool_requires("ccache/4.8.3")
+        
         if self.options.with_docs:
             # Doxygen will be handled by the system package manager
             pass
     
+    def package_id(self):
+        # Tests don't end up in the package, keep them out of the binary id so
+        # they don't fragment the package cache. with_docs stays: it installs
+        # the generated documentation into the package.
+        del self.info.options.with_tests
+        self.info.options.rm_safe("with_ccache")
+    
     def layout(self):
         cmake_layout(self)
     
@@ -57,10 +83,17 @@ class CppTemplateConan(ConanFile):
         deps = CMakeDeps(self)
         deps.generate()
         
-        tc = CMakeToolchain(self)
+        tc = CMakeToolchain(self, generator="Ninja")
         tc.variables["BUILD_SHARED_LIBS"] = self.options.shared
         tc.variables["BUILD_TESTS"] = self.options.with_tests
         tc.variables["BUILD_DOCS"] = self.options.with_docs
+        if self.options.get_safe("with_ccache"):
+            # Use the tool_requires binary by absolute path, it is only on PATH
+            # when the conanbuild environment is activated
+            ccache = self.dependencies.build["ccache"]
+            ccache_path = os.path.join(ccache.cpp_info.bindirs[0], "ccache")
+            tc.variables["CMAKE_C_COMPILER_LAUNCHER"] = ccache_path
+            tc.variables["CMAKE_CXX_COMPILER_LAUNCHER"] = ccache_path
         tc.generate()
     
     def build(self):
@@ -5,10 +5,39 @@ Formatting validation script for C++ Template Project
 Checks for common formatting issues that would cause clang-format CI failures
 """
 
+import argparse
+import atexit
+import functools
+import json
+import mmap
+import multiprocessing
 import os
 import re
+import shutil
+import subprocess
 import sys
-from pathlib import Path
+
+
+CPP_SUFFIXES = frozenset({'.cpp', '.hpp', '.h', '.cxx', '.cc'})
+HEADER_SUFFIXES = ('.hpp', '.h')
+CACHE_FILE = '.validate_formatting_cache.json'
+# Files larger than this are memory-mapped instead of read into memory. Walking
+# a mapping line by line is about 2x slower than splitlines(), so only files
+# big enough for a per-worker copy to matter (generated code) take that path.
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Patterns used by the per-file checks, compiled once at import
+_NAMESPACE_OPEN_RE = re.compile(rb'namespace\s+(\w+)')
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+# Bytes that may precede the LF of a line with trailing whitespace (or CRLF)
+_TRAILING_BYTES = b' \t\r\x0b\x0c'
+
+# Substrings headers are searched for by find_markers()
+_MARKERS = (b'\t', b'#pragma once', b'#ifndef', b'#define', b'#endif')
+
+# Characters of file paths passed to one ripgrep run, well below the 32767
+# character command line limit on Windows
+_RG_PATHS_BUDGET = 24000
 
 
 def print_colored(message, color):
@@ -24,145 +53,335 @@ def print_colored(message, color):
 
 
 def find_cpp_files():
-    """Find all C++ source files"""
+    """Find all C++ source files, sorted so output and --max-issues cut-offs are stable"""
     cpp_files = []
-    for root in ['src', 'include', 'examples', 'tests']:
-        if os.path.exists(root):
-            for file_path in Path(root).rglob('*'):
-                if file_path.suffix in ['.cpp', '.hpp', '.h', '.cxx', '.cc']:
-                    cpp_files.append(str(file_path))
+    stack = ['tests', 'examples', 'include', 'src']
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:  # missing, not a directory, or unreadable
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1] in CPP_SUFFIXES:
+                    cpp_files.append(entry.path)
     return sorted(cpp_files)
 
 
-def check_line_length(file_path, max_length=100):
-    """Check for lines that are too long"""
+def _iter_lines(buf):
+    """Yield the lines of a bytes-like buffer, keeping line endings
+    
+    Used for memory-mapped files so that only the current line is copied out
+    of the mapping. Lines end at LF, CRLF or a lone CR, exactly like
+    bytes.splitlines(), so line numbers don't depend on the file size.
+    """
+    start = 0
+    end = len(buf)
+    newline = -1
+    while start < end:
+        # Reuse the LF found earlier until the lines before it are consumed
+        if newline < start:
+            newline = buf.find(b'\n', start)
+            if newline == -1:
+                newline = end
+        stop = min(newline + 1, end)
+        carriage_return = buf.find(b'\r', start, stop)
+        if carriage_return != -1 and carriage_return + 1 != newline:
+            stop = carriage_return + 1
+        yield buf[start:stop]
+        start = stop
+
+
+def find_markers(data):
+    """Return the set of _MARKERS that occur in a file's contents
+    
+    Each marker is looked up with find(), which runs as a C-level search
+    directly on the bytes and, unlike 'in', also works on mmap buffers.
+    """
+    return {marker for marker in _MARKERS if data.find(marker) != -1}
+
+
+def check_include_guards(file_path, markers):
+    """Check for proper include guards or #pragma once in headers"""
+    if not file_path.endswith(HEADER_SUFFIXES):
+        return []
+    
     issues = []
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                # Remove newline for length check
-                line_content = line.rstrip('\n\r')
-                if len(line_content) > max_length:
-                    issues.append(f"{file_path}:{line_num}: Line too long ({len(line_content)} > {max_length})")
-    except Exception as e:
-        issues.append(f"{file_path}: Error reading file - {e}")
+    
+    # Check for #pragma once
+    if b'#pragma once' in markers:
+        return []
+    
+    # Check for traditional include guards
+    if not {b'#ifndef', b'#define', b'#endif'} <= markers:
+        issues.append(f"{file_path}: Missing or incomplete include guards")
     return issues
 
 
-def check_trailing_whitespace(file_path):
-    """Check for trailing whitespace"""
+def check_namespace_comments(file_path, lines, max_issues=0):
+    """Check for namespace closing comments
+    
+    lines may be any iterable of bytes lines and is consumed in a single
+    forward pass, so memory-mapped files stream through _iter_lines().
+    """
     issues = []
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                if line.rstrip('\n\r') != line.rstrip():
-                    issues.append(f"{file_path}:{line_num}: Trailing whitespace")
-    except Exception as e:
-        issues.append(f"{file_path}: Error reading file - {e}")
+    namespace_stack = []
+    for line_num, line in enumerate(lines, 1):
+        if max_issues and len(issues) >= max_issues:
+            break
+        
+        stripped = line.strip()
+        
+        # Track namespace openings, only running the regex on candidate lines
+        if stripped.startswith(b'namespace'):
+            namespace_match = _NAMESPACE_OPEN_RE.match(stripped)
+            if namespace_match:
+                namespace_stack.append((namespace_match.group(1), line_num))
+        # Check namespace closings, i.e. '}' alone or followed by a space
+        elif stripped[:2] in (b'}', b'} '):
+            if namespace_stack:
+                namespace_name, _ = namespace_stack.pop()
+                # Check if this closing brace has a proper comment
+                if b'// namespace' not in stripped:
+                    # Allow simple '}' for single line or very short namespaces
+                    # Only flag it if the namespace spans multiple lines
+                    if line_num > 10:  # Heuristic for namespace length
+                        issues.append(f"{file_path}:{line_num}: Missing namespace closing comment")
     return issues
 
 
-def check_tabs(file_path):
-    """Check for tab characters"""
-    issues = []
+CHECK_NAMES = [
+    "Line length",
+    "Trailing whitespace",
+    "Tab characters",
+    "Include guards",
+    "Namespace comments",
+    "Indentation",
+]
+
+
+def scan_file(file_path, max_length=100, max_issues=0, line_checks=True):
+    """Run every check on a file and return a (results, readable) tuple
+    
+    results maps check name to the list of issues found; readable is False
+    when the file could not be read.
+    """
+    # Runs in a worker process, so this must stay a module-level function
+    results = {check_name: [] for check_name in CHECK_NAMES}
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            if '\t' in content:
-                issues.append(f"{file_path}: Contains tab characters")
+        # Read as bytes to skip decoding; huge files are mapped, not copied
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
     except Exception as e:
-        issues.append(f"{file_path}: Error reading file - {e}")
-    return issues
+        for check_name in results:
+            results[check_name].append(f"{file_path}: Error reading file - {e}")
+        return results, False
+    
+    try:
+        _check_buffer(file_path, data, results, max_length, max_issues, line_checks)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return results, True
 
 
-def check_include_guards(file_path):
-    """Check for proper include guards or #pragma once in headers"""
-    if not file_path.endswith(('.hpp', '.h')):
-        return []
+def _check_buffer(file_path, data, results, max_length, max_issues, line_checks):
+    """Run every check on a file's contents, filling in scan_file() results"""
+    mapped = isinstance(data, mmap.mmap)
+    lines = _iter_lines(data) if mapped else data.splitlines(keepends=True)
+    _line_checks(file_path, lines, results, max_length, max_issues, line_checks)
     
-    issues = []
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-            # Check for #pragma once
-            if '#pragma once' in content:
-                return []
-            
-            # Check for traditional include guards
-            ifndef_pattern = r'#ifndef\s+(\w+)'
-            define_pattern = r'#define\s+(\w+)'
-            endif_pattern = r'#endif'
-            
-            ifndef_match = re.search(ifndef_pattern, content)
-            define_match = re.search(define_pattern, content)
-            endif_match = re.search(endif_pattern, content)
+    # Only headers need the include guard markers; for sources the tab test
+    # is a single C-level find() on the raw bytes, with no decoding
+    is_header = file_path.endswith(HEADER_SUFFIXES)
+    markers = find_markers(data) if is_header else set()
+    if line_checks and (b'\t' in markers if is_header else data.find(b'\t') != -1):
+        results["Tab characters"].append(f"{file_path}: Contains tab characters")
+    results["Include guards"] = check_include_guards(file_path, markers)
+    if mapped:
+        # Walk the mapping again, any line generator above is exhausted
+        lines = _iter_lines(data)
+    results["Namespace comments"] = check_namespace_comments(file_path, lines, max_issues)
+
+
+def _line_checks(file_path, lines, results, max_length, max_issues, line_checks):
+    """Check line length, trailing whitespace and indentation line by line"""
+    # Stops once max_issues issues were found (0 means no limit); line_checks
+    # is False when ripgrep already covered the length and whitespace checks
+    long_lines = results["Line length"]
+    trailing = results["Trailing whitespace"]
+    indentation = results["Indentation"]
+    
+    for line_num, line in enumerate(lines, 1):
+        if max_issues and len(long_lines) + len(trailing) + len(indentation) >= max_issues:
+            break
+        
+        if line_checks:
+            # Most lines are short and end in a non-blank byte plus LF, so only
+            # strip the newline when a cheap byte test says a check could fail
+            if len(line) > max_length:
+                line_content = line.rstrip(b'\n\r')
+                if len(line_content) > max_length:
+                    # Byte length only bounds the character length for non-ASCII lines
+                    line_length = len(line_content.decode('utf-8', errors='replace'))
+                    if line_length > max_length:
+                        long_lines.append(f"{file_path}:{line_num}: Line too long ({line_length} > {max_length})")
             
-            if not (ifndef_match and define_match and endif_match):
-                issues.append(f"{file_path}: Missing or incomplete include guards")
-                
-    except Exception as e:
-        issues.append(f"{file_path}: Error reading file - {e}")
-    return issues
+            if line[-1:] != b'\n' or line[-2:-1] in _TRAILING_BYTES:
+                if line.rstrip(b'\n\r') != line.rstrip():
+                    trailing.append(f"{file_path}:{line_num}: Trailing whitespace")
+        
+        # Only report first inconsistent indentation per file, which needs a
+        # leading space
+        if not indentation and line[:1] == b' ':
+            lstripped = line.lstrip(b' ')
+            leading_space = len(line) - len(lstripped)
+            # Blank lines are skipped, only misaligned lines get stripped and decoded
+            if leading_space % 4 != 0 and lstripped.strip():
+                # Allow some flexibility for alignment
+                text = lstripped.decode('utf-8', errors='replace')
+                if not _NON_WORD_RE.search(text.lstrip()):  # Not alignment
+                    indentation.append(f"{file_path}:{line_num}: Inconsistent indentation (not multiple of 4)")
 
 
-def check_namespace_comments(file_path):
-    """Check for namespace closing comments"""
-    issues = []
+def _path_batches(paths, budget):
+    """Split paths into consecutive batches whose total length fits the budget"""
+    batch = []
+    length = 0
+    for path in paths:
+        # Count a separator and quotes per path
+        if batch and length + len(path) + 3 > budget:
+            yield batch
+            batch = []
+            length = 0
+        batch.append(path)
+        length += len(path) + 3
+    if batch:
+        yield batch
+
+
+def _run_ripgrep(rg, args, cpp_files):
+    """Run ripgrep over the given files and return its raw output"""
+    # --with-filename keeps the 'path\0' prefix even for a single file, while
+    # --text and --encoding none search the raw bytes (NULs, BOMs, UTF-16) the
+    # same as the Python checks do
+    cmd = [rg, '--no-config', '--no-heading', '--with-filename', '--line-number', '--null',
+           '--text', '--encoding', 'none', '--color', 'never']
+    output = []
+    for batch in _path_batches(cpp_files, _RG_PATHS_BUDGET):
+        result = subprocess.run(cmd + args + ['--'] + batch, capture_output=True)
+        # Exit status 1 only means nothing matched
+        if result.returncode > 1:
+            raise RuntimeError(result.stderr.decode('utf-8', errors='replace').strip())
+        output.append(result.stdout)
+    return b''.join(output)
+
+
+def ripgrep_line_checks(rg, cpp_files, max_length=100, max_issues=0):
+    """Run the line length, trailing whitespace and tab checks with ripgrep
+    
+    Returns a dict mapping file path to a dict of check name to issues, in the
+    same shape scan_file() produces, or None if ripgrep could not be run and
+    the Python checks should be used instead. Like the Python checks, line
+    lengths are matched on bytes and then measured in characters; unlike them,
+    ripgrep does not treat a lone CR as a line break.
+    """
+    results = {file_path: {"Line length": [], "Trailing whitespace": [], "Tab characters": []}
+               for file_path in cpp_files}
+    max_count = ['--max-count', str(max_issues)] if max_issues else []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            
-        namespace_stack = []
-        for line_num, line in enumerate(lines, 1):
-            stripped = line.strip()
-            
-            # Track namespace openings
-            namespace_match = re.match(r'namespace\s+(\w+)', stripped)
-            if namespace_match:
-                namespace_stack.append((namespace_match.group(1), line_num))
-            
-            # Check namespace closings
-            if stripped == '}' or stripped.startswith('} '):
-                if namespace_stack:
-                    namespace_name, _ = namespace_stack.pop()
-                    # Check if this closing brace has a proper comment
-                    if not re.match(r'}  // namespace \w+', stripped) and \
-                       not re.match(r'} // namespace \w+', stripped):
-                        # Allow simple '}' for single line or very short namespaces
-                        # Only flag it if the namespace spans multiple lines
-                        if line_num > 10:  # Heuristic for namespace length
-                            issues.append(f"{file_path}:{line_num}: Missing namespace closing comment")
-                            
-    except Exception as e:
-        issues.append(f"{file_path}: Error reading file - {e}")
-    return issues
+        # Byte matches may turn out short in characters, so the long line
+        # budget is applied below rather than with --max-count
+        long_lines = _run_ripgrep(rg, [rf'(?-u:[^\r\n]){{{max_length + 1},}}'], cpp_files)
+        trailing = _run_ripgrep(rg, max_count + [r'[ \t\x0B\x0C]\r*$'], cpp_files)
+        tabs = _run_ripgrep(rg, ['--files-with-matches', r'\t'], cpp_files)
+    except (OSError, RuntimeError) as e:
+        print_colored(f"ripgrep failed ({e}), falling back to Python checks", 'yellow')
+        return None
+    
+    # Matches are printed as 'path\0line:content\n'; content may hold a lone CR
+    for match in long_lines.split(b'\n'):
+        if not match:
+            continue
+        path, _, rest = match.partition(b'\0')
+        line_num, _, content = rest.partition(b':')
+        file_path = os.fsdecode(path)
+        issues = results[file_path]["Line length"]
+        if max_issues and len(issues) >= max_issues:
+            continue
+        # Byte length only bounds the character length for non-ASCII lines
+        line_length = len(content.rstrip(b'\r').decode('utf-8', errors='replace'))
+        if line_length > max_length:
+            issues.append(
+                f"{file_path}:{int(line_num)}: Line too long ({line_length} > {max_length})")
+    for match in trailing.split(b'\n'):
+        if not match:
+            continue
+        path, _, rest = match.partition(b'\0')
+        file_path = os.fsdecode(path)
+        results[file_path]["Trailing whitespace"].append(
+            f"{file_path}:{int(rest.partition(b':')[0])}: Trailing whitespace")
+    # With --files-with-matches paths are only separated by NUL, not newlines
+    for path in tabs.split(b'\0'):
+        if not path:
+            continue
+        file_path = os.fsdecode(path)
+        results[file_path]["Tab characters"].append(f"{file_path}: Contains tab characters")
+    return results
 
 
-def check_indentation(file_path):
-    """Check for consistent indentation (4 spaces)"""
-    issues = []
+def load_cache(cache_path, settings):
+    """Load cached per-file results, or an empty cache if it is missing or stale
+    
+    The cache is discarded as a whole when the settings it was written with
+    differ, e.g. after this script or --max-issues changed.
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                if line.strip() == '':
-                    continue
-                    
-                # Check leading whitespace
-                leading_space = len(line) - len(line.lstrip(' '))
-                if leading_space > 0 and leading_space % 4 != 0:
-                    # Allow some flexibility for alignment
-                    if not re.match(r'.*[^\w\s].*', line.lstrip()):  # Not alignment
-                        issues.append(f"{file_path}:{line_num}: Inconsistent indentation (not multiple of 4)")
-                        break  # Only report first occurrence per file
-                        
-    except Exception as e:
-        issues.append(f"{file_path}: Error reading file - {e}")
-    return issues
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = None
+    if not isinstance(cache, dict) or cache.get('settings') != settings:
+        cache = {'settings': settings, 'files': {}}
+    return cache
+
+
+def save_cache(cache_path, cache):
+    """Write the per-file results cache, ignoring unwritable locations"""
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print_colored(f"Could not write cache {cache_path} - {e}", 'yellow')
+
+
+def non_negative_int(value):
+    """argparse type for counts where 0 means unlimited"""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or greater, got {number}")
+    return number
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Check C++ sources for common formatting issues")
+    parser.add_argument('--max-issues', type=non_negative_int, default=100,
+                        help="stop scanning after this many issues (0 for no limit, default: 100)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"rescan every file instead of reusing results from {CACHE_FILE}")
+    return parser.parse_args()
 
 
 def main():
     """Main validation function"""
+    args = parse_args()
+    
     print_colored("🔍 Validating C++ code formatting...", 'blue')
     
     cpp_files = find_cpp_files()
@@ -174,26 +393,79 @@ def main():
     
     all_issues = []
     
-    # Run all checks
-    checks = [
-        ("Line length", check_line_length),
-        ("Trailing whitespace", check_trailing_whitespace),
-        ("Tab characters", check_tabs),
-        ("Include guards", check_include_guards),
-        ("Namespace comments", check_namespace_comments),
-        ("Indentation", check_indentation),
-    ]
-    
-    for check_name, check_func in checks:
+    # Reuse results for files whose size and mtime are unchanged since the last run
+    script_stat = os.stat(__file__)
+    # ripgrep and the Python checks differ in edge cases (lone CRs), so results
+    # from one backend are not reused by the other
+    rg = shutil.which('rg')
+    settings = [script_stat.st_size, script_stat.st_mtime_ns, args.max_issues, bool(rg)]
+    cache = load_cache(CACHE_FILE, settings) if not args.no_cache else {'settings': settings, 'files': {}}
+    cached_files = cache['files']
+    file_keys = {}
+    for file_path in cpp_files:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            continue
+        file_keys[file_path] = (st.st_size, st.st_mtime_ns)
+    
+    # Forget files that no longer exist, then persist whatever this run adds
+    for file_path in list(cached_files):
+        if file_path not in file_keys:
+            del cached_files[file_path]
+    if not args.no_cache:
+        atexit.register(save_cache, CACHE_FILE, cache)
+    
+    stale_files = []
+    for file_path in cpp_files:
+        entry = cached_files.get(file_path)
+        if entry is None or file_keys.get(file_path) != (entry['size'], entry['mtime_ns']):
+            stale_files.append(file_path)
+    stale = set(stale_files)
+    
+    # Run all checks, one task per file, until the issue budget is spent
+    file_results = []
+    issue_count = 0
+    
+    # Let ripgrep handle the purely line-based checks when it is installed
+    rg_results = None
+    if rg and stale_files:
+        rg_results = ripgrep_line_checks(rg, stale_files, max_issues=args.max_issues)
+    
+    scan = functools.partial(scan_file, max_issues=args.max_issues, line_checks=rg_results is None)
+    # Fully cached runs don't need any worker processes
+    pool = multiprocessing.Pool(min(os.cpu_count() or 1, len(stale_files))) if stale_files else None
+    try:
+        scanned = pool.imap(scan, stale_files, chunksize=16) if pool else iter(())
+        for file_path in cpp_files:
+            if file_path in stale:
+                results, readable = next(scanned)
+                if rg_results is not None:
+                    results.update(rg_results[file_path])
+                # Read errors are not cached, fixing permissions keeps size and mtime
+                if readable and file_path in file_keys:
+                    size, mtime_ns = file_keys[file_path]
+                    cached_files[file_path] = {'mtime_ns': mtime_ns, 'size': size, 'issues': results}
+            else:
+                results = cached_files[file_path]['issues']
+            file_results.append(results)
+            issue_count += sum(len(issues) for issues in results.values())
+            if args.max_issues and issue_count >= args.max_issues:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+    
+    if len(file_results) < len(cpp_files):
+        print_colored(f"Stopped after {issue_count} issues (--max-issues {args.max_issues}), "
+                      f"{len(cpp_files) - len(file_results)} files not checked", 'yellow')
+    
+    for check_name in CHECK_NAMES:
         print(f"• Checking {check_name.lower()}...")
         check_issues = []
         
-        for file_path in cpp_files:
-            if check_name == "Line length":
-                file_issues = check_func(file_path, 100)  # 100 char limit
-            else:
-                file_issues = check_func(file_path)
-            check_issues.extend(file_issues)
+        for results in file_results:
+            check_issues.extend(results[check_name])
         
         if check_issues:
             print_colored(f"  ⚠️  Found {len(check_issues)} issues", 'yellow')